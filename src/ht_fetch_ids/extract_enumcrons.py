@@ -31,20 +31,15 @@ def main() -> int:
 
 
 def write_extracted_enumcrons(fp: io.StringIO) -> None:
-    writer = csv.DictWriter(
-        sys.stdout,
-        fieldnames=["enumcron"]
-        + [field.name for field in dataclasses.fields(ht_fetch_ids.Enumcron)],
-        dialect="excel-tab",
-    )
-    writer.writeheader()
+    field_names = [field.name for field in dataclasses.fields(ht_fetch_ids.Enumcron)]
+    writer = csv.writer(sys.stdout, dialect="excel-tab")
+    writer.writerow(["enumcron"] + field_names)
     for line in fp:
         enumcron = line.strip()
+        extracted = ht_fetch_ids.extract_enumcron(enumcron)
+        # The field values are immutable, so skip the deep copy asdict makes
         writer.writerow(
-            {
-                "enumcron": enumcron,
-                **dataclasses.asdict(ht_fetch_ids.extract_enumcron(enumcron)),
-            }
+            [enumcron] + [getattr(extracted, field_name) for field_name in field_names]
         )
 
 
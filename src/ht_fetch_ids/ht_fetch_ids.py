@@ -4,13 +4,17 @@ import requests_cache
 import csv
 import argparse
 import collections
+import concurrent.futures
+import contextlib
 import dataclasses
 import re
 import sys
 import io
-import datetime
+import threading
+import time
 import functools
 import itertools
+import operator
 from pathlib import Path
 
 from typing import (
@@ -23,20 +27,36 @@ from typing import (
     Callable,
     Hashable,
     Sequence,
+    ContextManager,
+    TextIO,
 )
 
 
-Item = collections.namedtuple(
-    "Item", "orig fromRecord htid itemURL rightsCode lastUpdate enumcron usRightsString"
-)
+@dataclasses.dataclass(frozen=True, slots=True)
+class Item:
+    orig: str
+    fromRecord: str
+    htid: str
+    itemURL: str
+    rightsCode: str
+    lastUpdate: int
+    enumcron: Union[str, Literal[False]]
+    usRightsString: str
 
 
-BriefRecord = collections.namedtuple(
-    "BriefRecord", "recordnumber recordURL titles isbns issns oclcs, lccns publishDates"
-)
+@dataclasses.dataclass(frozen=True, slots=True)
+class BriefRecord:
+    recordnumber: str
+    recordURL: str
+    titles: list[str]
+    isbns: list[str]
+    issns: list[str]
+    oclcs: list[str]
+    lccns: list[str]
+    publishDates: list[str]
 
 
-@dataclasses.dataclass(frozen=True)
+@dataclasses.dataclass(frozen=True, slots=True)
 class Enumcron:
     seriesspan: Optional[tuple[int, int]] = dataclasses.field(
         default=None, compare=False
@@ -61,6 +81,51 @@ SPAN_ORDER = [
     "partspan",
     "datespan",
 ]
+SPANS_GETTER = operator.attrgetter(*SPAN_ORDER)
+SIERRA_DIALECT = "sierra"
+csv.register_dialect(SIERRA_DIALECT, delimiter="\t", quoting=csv.QUOTE_NONE)
+INPUT_BUFFER_SIZE = 1024 * 1024
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+PENDING_ROWS_PER_WORKER = 4
+
+# Matches every enumcron field in one left-to-right scan. The alternatives are
+# ordered by extraction priority and the outer group of each is named after the
+# Enumcron field it fills so the field is available as match.lastgroup. Copy
+# numbers stop short of four digits so that copyright years like "c1985" are
+# left for datespan, which the scan would otherwise reach too late.
+ENUMCRON_PATTERN = re.compile(
+    r"(?P<volumespan>v(?:ol)?\.? ?(?P<volumespan_start>\d+)(?:-(?P<volumespan_end>\d+))?,?)"
+    r"|(?P<partspan>p(?:t)?\.? ?(?P<partspan_start>\d+)(?:-(?P<partspan_end>\d+))?,?)"
+    r"|(?P<numberspan>(?<![a-z])n(?:o)?\.? ?(?P<numberspan_start>\d+)(?:-(?P<numberspan_end>\d+))?,?)"
+    r"|(?P<seriesspan>(?P<no_series>nser|n\.s\.)"
+    r"|(?<![a-z])s(?:er)?\.? ?(?P<seriesspan_start>\d+)(?:-(?P<seriesspan_end>\d+))?,?)"
+    r"|(?P<datespan>(?:yr\. ?)?(?P<datespan_start>\d{4})(?:[-/ ](?P<datespan_end>\d+))?)"
+    r"|(?P<copyspan>(?<![a-z])c(?:opy|p)?\.? ?(?P<copyspan_start>\d{1,3})(?!\d)"
+    r"(?:-(?P<copyspan_end>\d{1,3})(?!\d))?,?)"
+    r"|(?P<is_index>inde?x:?)"
+    r"|(?P<is_supplement>suppl\.?)",
+    re.IGNORECASE,
+)
+# The most common enumcrons are a lone volume or year, which fill a single
+# field and leave no remainder
+SIMPLE_ENUMCRON_PATTERN = re.compile(
+    r"(?P<volumespan>v(?:ol)?\.? ?(?P<volumespan_start>\d+)(?:-(?P<volumespan_end>\d+))?)"
+    r"|(?P<datespan>(?P<datespan_start>\d{4})(?:[-/](?P<datespan_end>\d+))?)",
+    re.IGNORECASE,
+)
+TRANSLATIONS = {
+    "jahrg": "v",
+    "Jahrg": "v",
+    "bd": "pt",
+}
+TRANSLATIONS_PATTERN = re.compile("|".join(map(re.escape, TRANSLATIONS)))
+COPY_NUMBER_PATTERN = re.compile(r"(^|\W)c(opy)?[\. ]?\d+")
+# An ISSN must be the whole value, an ISBN can be anywhere in it. ISBN-13s are
+# preferred over ISBN-10s wherever they appear in the value.
+ISSN_PATTERN = re.compile(r"^[0-9]{4}-?[0-9]{3}[0-9xX]$")
+ISBN13_PATTERN = re.compile(r"[0-9]{12}[0-9xX]")
+ISBN10_PATTERN = re.compile(r"[0-9]{9}[0-9xX]")
+LCCN_PATTERN = re.compile(r"[0-9]{8}")
 
 
 def main() -> int:
@@ -86,7 +151,9 @@ def main() -> int:
     )
     parser.add_argument(
         "--output-dialect",
-        choices=csv.list_dialects(),
+        choices=[
+            dialect for dialect in csv.list_dialects() if dialect != SIERRA_DIALECT
+        ],
         default="excel-tab",
         help="Output CSV format",
     )
@@ -129,105 +196,215 @@ def main() -> int:
         default=None,
         help="Path to optional http requests cache",
     )
+    parser.add_argument(
+        "--workers",
+        type=positive_int,
+        default=4,
+        help="Number of concurrent HT API requests",
+    )
     args = parser.parse_args()
 
-    with open(args.export_path, mode="r", encoding="utf-8") as fp:
+    with open(
+        args.export_path, mode="r", encoding="utf-8", buffering=INPUT_BUFFER_SIZE
+    ) as fp, open_output() as output:
         reader = read_sierra_export(
             fp,
             field_delimiter=args.field_delimiter,
             text_qualifier=args.text_qualifier,
             repeated_field_delimiter=args.repeated_field_delimiter,
+            split_columns={
+                args.oclc_column,
+                args.lccn_column,
+                args.isn_column,
+                args.volume_column,
+            },
         )
 
-        writer = csv.DictWriter(
-            sys.stdout,
-            fieldnames=reader.fieldnames
-            + ["ht-recordURLs", "enumcrons", "group-counts"]
+        ht_fieldnames = (
+            ["ht-recordURLs", "enumcrons", "group-counts"]
             + (["volume-match-pct", "enumcron-matches"] if args.vol_matcher else [])
-            + ["htids"],
-            dialect=args.output_dialect,
+            + ["htids"]
         )
-        writer.writeheader()
+        writer = csv.writer(output, dialect=args.output_dialect)
+        writer.writerow(reader.fieldnames + ht_fieldnames)
 
         with (
-            requests_cache.CachedSession(args.http_cache, backend="sqlite")
+            # WAL lets the worker threads read the cache while another writes and
+            # fast_save skips the fsync after every cached response
+            requests_cache.CachedSession(
+                args.http_cache, backend="sqlite", wal=True, fast_save=True
+            )
             if args.http_cache
             else requests.Session()
         ) as session:
-            for row in reader:
-                oclcs = row.get(args.oclc_column)
-                lccns = row.get(args.lccn_column)
-                isns = row.get(args.isn_column)
-                vols = row.get(args.volume_column)
-                result = search_ht(
-                    oclc=oclcs[0] if oclcs else None,
-                    lccn=lccns[0] if lccns else None,
-                    isns=isns,
-                    session=session,
+            # One pooled connection per worker so none are discarded and reopened
+            session.mount(
+                "https://",
+                ThrottledHTTPAdapter(delay=args.delay, pool_maxsize=args.workers),
+            )
+            # HT API requests are I/O bound, so worker threads overlap them while
+            # rows are written in input order
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=args.workers
+            ) as executor:
+                results = bounded_map(
+                    executor,
+                    functools.partial(
+                        match_row,
+                        session=session,
+                        oclc_index=reader.column_indexes.get(args.oclc_column),
+                        lccn_index=reader.column_indexes.get(args.lccn_column),
+                        isn_index=reader.column_indexes.get(args.isn_column),
+                        volume_index=reader.column_indexes.get(args.volume_column),
+                        vol_matcher=args.vol_matcher,
+                    ),
+                    reader,
+                    limit=args.workers * PENDING_ROWS_PER_WORKER,
                 )
-                if result:
-                    records = [
-                        BriefRecord(recordnumber=recordnumber, **record_args)
-                        for recordnumber, record_args in result["records"].items()
-                    ]
-                    items = [Item(**item_args) for item_args in result["items"]]
-                    row["ht-recordURLs"] = [record.recordURL for record in records]
-                    enumcrons = {
-                        item.enumcron for item in items if item.enumcron is not False
-                    }
-                    row["enumcrons"] = list(enumcrons)
-                    groups = group_items_by_origin(items)
-                    row["group-counts"] = [
-                        str(len(group_items)) for group_items in groups.values()
-                    ]
-                    if args.vol_matcher and enumcrons and row[args.volume_column]:
-                        selected_items, enumcron_matches = pick_volumes(
-                            items,
-                            row[args.volume_column],
-                            MATCH_STRATEGIES[args.vol_matcher],
-                        )
-                        row["volume-match-pct"] = [
-                            f"{(len(selected_items) / len(set(extract_enumcron(v) for v in row[args.volume_column]))) * 100:.1f}"
-                        ]
-                        row["enumcron-matches"] = [
-                            f"{held.raw}→{ht.raw}"
-                            for held, ht_set in enumcron_matches.items()
-                            for ht in ht_set
-                        ]
-                    else:
-                        selected_items = pick_group(groups)
-                    row["htids"] = [item.htid for item in selected_items]
-                writer.writerow({key: "; ".join(values) for key, values in row.items()})
+                for row, ht_columns in results:
+                    writer.writerow(
+                        [format_output_value(values, reader) for values in row]
+                        + ["; ".join(ht_columns.get(key, [])) for key in ht_fieldnames]
+                    )
     return 0
 
 
+def open_output() -> ContextManager[TextIO]:
+    try:
+        fileno = sys.stdout.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        # stdout has been replaced in-process, e.g. by contextlib.redirect_stdout
+        return contextlib.nullcontext(sys.stdout)
+    # Write through a large buffer instead of line-by-line, newline="" as the
+    # csv module expects
+    return open(
+        fileno,
+        mode="w",
+        encoding="utf-8",
+        newline="",
+        buffering=OUTPUT_BUFFER_SIZE,
+        closefd=False,
+    )
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def bounded_map(
+    executor: concurrent.futures.Executor,
+    func: Callable[[Any], Any],
+    iterable: Iterable[Any],
+    limit: int,
+) -> Iterator[Any]:
+    # Like executor.map, but only keeps limit calls in flight instead of
+    # submitting the whole export up front
+    pending = collections.deque()
+    for value in iterable:
+        if len(pending) >= limit:
+            yield pending.popleft().result()
+        pending.append(executor.submit(func, value))
+    while pending:
+        yield pending.popleft().result()
+
+
+def format_output_value(
+    values: Union[list[str], str], reader: "SierraExportReader"
+) -> str:
+    if isinstance(values, list):
+        return "; ".join(values)
+    return reader.join_repeated_values(values, joiner="; ")
+
+
+def match_row(
+    row: list[Union[list[str], str]],
+    session: requests.Session,
+    oclc_index: Optional[int],
+    lccn_index: Optional[int],
+    isn_index: Optional[int],
+    volume_index: Optional[int],
+    vol_matcher: Optional[str],
+) -> tuple[list[Union[list[str], str]], dict[str, list[str]]]:
+    oclcs = row[oclc_index] if oclc_index is not None else []
+    lccns = row[lccn_index] if lccn_index is not None else []
+    isns = row[isn_index] if isn_index is not None else []
+    volumes = row[volume_index] if volume_index is not None else []
+    ht_columns = dict()
+    result = search_ht(
+        oclc=oclcs[0] if oclcs else None,
+        lccn=lccns[0] if lccns else None,
+        isns=isns,
+        session=session,
+    )
+    if not result:
+        return row, ht_columns
+
+    records = [
+        BriefRecord(recordnumber=recordnumber, **record_args)
+        for recordnumber, record_args in result["records"].items()
+    ]
+    # HT reports lastUpdate as a string, parse it once here rather than on
+    # every comparison
+    items = [
+        Item(**{**item_args, "lastUpdate": int(item_args["lastUpdate"])})
+        for item_args in result["items"]
+    ]
+    ht_columns["ht-recordURLs"] = [record.recordURL for record in records]
+    enumcrons = {item.enumcron for item in items if item.enumcron is not False}
+    ht_columns["enumcrons"] = list(enumcrons)
+    groups = group_items_by_origin(items)
+    ht_columns["group-counts"] = [
+        str(len(group_items)) for group_items in groups.values()
+    ]
+    if vol_matcher and enumcrons and volumes:
+        held_enumcrons = {extract_enumcron(volume) for volume in volumes}
+        selected_items, enumcron_matches = pick_volumes(
+            items,
+            held_enumcrons,
+            MATCH_STRATEGIES[vol_matcher],
+        )
+        ht_columns["volume-match-pct"] = [
+            f"{(len(selected_items) / len(held_enumcrons)) * 100:.1f}"
+        ]
+        ht_columns["enumcron-matches"] = [
+            f"{held.raw}→{ht.raw}"
+            for held, ht_set in enumcron_matches.items()
+            for ht in ht_set
+        ]
+    else:
+        selected_items = pick_group(groups)
+    ht_columns["htids"] = [item.htid for item in selected_items]
+    return row, ht_columns
+
+
 def pick_volumes(
     items: list[Item],
-    holdings: list[str],
+    held_enumcrons: set[Enumcron],
     strategy: MatchStrategy,
     exclude_indexes: bool = True,
 ) -> tuple[list[Item], dict[Enumcron, Enumcron]]:
-    if not holdings:
+    if not held_enumcrons:
         raise ValueError("no holdings provided")
     if not items:
         raise ValueError("no items to match")
 
-    held_enumcrons = [extract_enumcron(holding) for holding in set(holdings)]
     if exclude_indexes:
-        held_enumcrons = [
+        held_enumcrons = {
             held_enumcron
             for held_enumcron in held_enumcrons
             if not held_enumcron.is_index
-        ]
+        }
     ht_enumcrons = dict()
     for item in items:
         ht_enumcron = extract_enumcron(item.enumcron)
-        if ht_enumcron in ht_enumcrons:
-            if int(item.lastUpdate) < int(ht_enumcrons[ht_enumcron].lastUpdate):
-                continue
-        ht_enumcrons[ht_enumcron] = item
+        current = ht_enumcrons.get(ht_enumcron)
+        if current is None or item.lastUpdate >= current.lastUpdate:
+            ht_enumcrons[ht_enumcron] = item
 
-    matches = strategy(set(held_enumcrons), set(ht_enumcrons))
+    matches = strategy(held_enumcrons, set(ht_enumcrons))
     return (
         [
             ht_enumcrons[ht_enumcron]
@@ -288,8 +465,10 @@ def spans_matcher(
         ht_enumcrons_by_key.update(make_spans_dict(ht_enumcron, match_on))
 
     matches = collections.defaultdict(set)
-    for key in set(holdings_by_key) & set(ht_enumcrons_by_key):
-        matches[holdings_by_key[key]].add(ht_enumcrons_by_key[key])
+    for key, ht_enumcron in ht_enumcrons_by_key.items():
+        holding = holdings_by_key.get(key)
+        if holding is not None:
+            matches[holding].add(ht_enumcron)
 
     return dict(matches)
 
@@ -324,9 +503,14 @@ def guess_mutual_spans(
 
 
 def filled_span_counts(enumcrons: Iterable[Enumcron]) -> collections.Counter:
-    return collections.Counter(
-        attr for enumcron in enumcrons for attr in SPAN_ORDER if getattr(enumcron, attr)
-    )
+    # Fetch every span of an enumcron in one attrgetter call, then count
+    # each span's column of values
+    counts = collections.Counter()
+    for attr, values in zip(SPAN_ORDER, zip(*map(SPANS_GETTER, enumcrons))):
+        count = sum(map(bool, values))
+        if count:
+            counts[attr] = count
+    return counts
 
 
 def counts_to_percents(
@@ -338,27 +522,30 @@ def counts_to_percents(
 def make_spans_dict(
     enumcron: Enumcron, attrs: Sequence[str]
 ) -> dict[tuple[Optional[int], ...], Enumcron]:
-    return {key: enumcron for key in make_spans_set(enumcron, attrs=attrs)}
+    return dict.fromkeys(make_spans_set(enumcron, attrs=attrs), enumcron)
 
 
 def make_spans_set(
     enumcron: Enumcron, attrs: Sequence[str]
-) -> set[tuple[Optional[int], ...]]:
-    spans = []
-    for attr in attrs:
-        value = getattr(enumcron, attr)
-        if not value:
-            spans.append([None])
-            continue
-        start, end = value
-        if isinstance(start, datetime.date) or isinstance(end, datetime.date):
-            start, end = start.year, end.year
-        spans.append(range(start, end + 1))
-    spans_set = set(itertools.product(*spans))
-    spans_set.discard((None,) * len(attrs))
-    return spans_set
+) -> frozenset[tuple[Optional[int], ...]]:
+    return make_spans_product(tuple(getattr(enumcron, attr) for attr in attrs))
+
 
+# Keyed on the span values rather than the Enumcron, which ignores seriesspan
+# in comparisons. The same spans recur across records and wide date spans
+# expand into many keys.
+@functools.lru_cache(maxsize=8192)
+def make_spans_product(
+    spans: tuple[Optional[tuple[int, int]], ...]
+) -> frozenset[tuple[Optional[int], ...]]:
+    ranges = [range(span[0], span[1] + 1) if span else [None] for span in spans]
+    spans_set = set(itertools.product(*ranges))
+    spans_set.discard((None,) * len(spans))
+    return frozenset(spans_set)
 
+
+# The same volume labels ("v.1", "v.2", ...) turn up on record after record
+@functools.lru_cache(maxsize=8192)
 def extract_enumcron(enumcron: str) -> Enumcron:
     if not enumcron:
         return Enumcron()
@@ -369,121 +556,55 @@ def extract_enumcron(enumcron: str) -> Enumcron:
         volumenum = int(asdigit)
         return Enumcron(volumespan=(volumenum, volumenum), raw=enumcron)
 
-    remainder = " ".join(enumcron.split())  # Remove multiple spaces
-    remainder = translate_to_english(remainder)
-    remainder, volumespan = extract_volumespan(remainder)
-    remainder, partspan = extract_partspan(remainder)
-    remainder, numberspan = extract_numberspan(remainder)
-    remainder, seriesspan = extract_seriesspan(remainder)
-    remainder, datespan = extract_datespan(remainder)
-    remainder, copyspan = extract_copyspan(remainder)
-    remainder, is_index = extract_is_index(remainder)
-    remainder, is_supplement = extract_is_supplement(remainder)
-
-    remainder = remainder.strip(" ,()[]")
-    remainder = remainder or None
-
-    return Enumcron(
-        volumespan=volumespan,
-        partspan=partspan,
-        numberspan=numberspan,
-        seriesspan=seriesspan,
-        datespan=datespan,
-        copyspan=copyspan,
-        is_index=is_index,
-        is_supplement=is_supplement,
-        remainder=remainder,
-        raw=enumcron,
-    )
-
-
-def extract_volumespan(enumcron: str) -> tuple[str, Optional[tuple[int, int]]]:
-    return extract_simple_span(r"v(?:ol)?\.? ?(\d+)(?:-(\d+))?,?", enumcron)
-
-
-def extract_numberspan(enumcron: str) -> tuple[str, Optional[tuple[int, int]]]:
-    return extract_simple_span(r"(?:^|[^a-z])n(?:o)?\.? ?(\d+)(?:-(\d+))?,?", enumcron)
-
-
-def extract_partspan(enumcron: str) -> tuple[str, Optional[tuple[int, int]]]:
-    return extract_simple_span(r"p(?:t)?\.? ?(\d+)(?:-(\d+))?,?", enumcron)
-
-
-def extract_seriesspan(enumcron: str) -> tuple[str, Optional[tuple[int, int]]]:
-    remainder, match = search_and_remove(
-        r"(nser|n\.s\.)|(?:(?:^|[^a-z])s(?:er)?\.? ?(\d+)(?:-(\d+))?),?", enumcron
-    )
-    if not match:
-        return remainder, None
-    no_series, start, end = match.groups()
-    if no_series:
-        return remainder, None
-    return remainder, (int(start), int(end) if end else int(start))
-
-
-def extract_copyspan(enumcron: str) -> tuple[str, Optional[tuple[int, int]]]:
-    return extract_simple_span(
-        r"(?:^|[^a-z])c(?:(?:opy)|(?:p))?\.? ?(\d+)(?:-(\d+))?,?", enumcron
-    )
-
-
-def extract_datespan(
-    enumcron: str,
-) -> tuple[str, Optional[tuple[datetime.date, datetime.date]]]:
-    remainder, match = search_and_remove(
-        r"(?:(?:yr\. ?)?(\d{4})(?:[-/ ](\d+))?)", enumcron
-    )
-    if not match:
-        return remainder, None
-    start, end = match.groups()
-    if end and len(end) == 2:
-        end = start[:2] + end
-    return (
-        remainder,
-        (
-            datetime.date(year=int(start), month=1, day=1),
-            datetime.date(year=int(end) if end else int(start), month=12, day=31),
-        ),
-    )
-
-
-def extract_simple_span(
-    pattern: str, enumcron: str
-) -> tuple[str, Optional[tuple[int, int]]]:
-    remainder, match = search_and_remove(pattern, enumcron)
-    if not match:
-        return remainder, None
-    start, end = match.groups()
-    return remainder, (int(start), int(end) if end else int(start))
-
-
-def extract_is_index(enumcron: str) -> tuple[str, bool]:
-    remainder, match = search_and_remove(r"(inde?x:?)", enumcron)
-    return remainder, bool(match)
+    if match := SIMPLE_ENUMCRON_PATTERN.fullmatch(enumcron):
+        field = match.lastgroup
+        return Enumcron(**{field: extract_field_value(match, field)}, raw=enumcron)
+
+    text = " ".join(enumcron.split())  # Remove multiple spaces
+    text = translate_to_english(text)
+
+    fields = dict()
+    unmatched = []
+    position = unmatched_start = 0
+    while match := ENUMCRON_PATTERN.search(text, position):
+        field = match.lastgroup
+        if field in fields:
+            # Only the first occurrence of a field is extracted, later ones are
+            # left in the remainder but may still contain other fields
+            position = match.start() + 1
+            continue
+        fields[field] = extract_field_value(match, field)
+        unmatched.append(text[unmatched_start : match.start()])
+        position = unmatched_start = match.end()
+    unmatched.append(text[unmatched_start:])
 
+    remainder = " ".join(unmatched).strip(" ,()[]")
+    remainder = remainder or None
 
-def extract_is_supplement(enumcron: str) -> tuple[str, bool]:
-    remainder, match = search_and_remove(r"(suppl\.?)", enumcron)
-    return remainder, bool(match)
+    return Enumcron(**fields, remainder=remainder, raw=enumcron)
 
 
-def search_and_remove(pattern: str, s: str) -> tuple[str, Optional[re.Match]]:
-    match = re.search(pattern, s.casefold())
-    if match is None:
-        return s, None
-    return s[: match.start()] + " " + s[match.end() :], match
+def extract_field_value(
+    match: re.Match, field: str
+) -> Union[bool, None, tuple[int, int]]:
+    if field in ("is_index", "is_supplement"):
+        return True
+    if field == "seriesspan" and match.group("no_series"):
+        return None
+    start, end = match.group(f"{field}_start", f"{field}_end")
+    if field == "datespan" and end:
+        if len(end) == 2:
+            end = start[:2] + end
+        # An end year before the start or past 9999 is a typo, not a span
+        if not int(start) <= int(end) <= 9999:
+            end = None
+    return (int(start), int(end) if end else int(start))
 
 
 def translate_to_english(enumcron: str) -> str:
-    translations = {
-        "jahrg": "v",
-        "Jahrg": "v",
-        "bd": "pt",
-    }
-    translated = enumcron
-    for foreign, english in translations.items():
-        translated = translated.replace(foreign, english)
-    return translated
+    if not TRANSLATIONS_PATTERN.search(enumcron):
+        return enumcron
+    return TRANSLATIONS_PATTERN.sub(lambda match: TRANSLATIONS[match.group()], enumcron)
 
 
 def pick_group(groups: dict[tuple[str, str], list[Item]]) -> list[Item]:
@@ -492,32 +613,27 @@ def pick_group(groups: dict[tuple[str, str], list[Item]]) -> list[Item]:
     return max((group for group in groups.values()), key=score_group)
 
 
-def score_group(group: list[Item]) -> float:
-    enumcrons = {item.enumcron for item in group}
+def score_group(group: list[Item]) -> tuple[int, int]:
+    enumcrons = set()
+    most_recent_update = 0
+    for item in group:
+        enumcrons.add(item.enumcron)
+        if item.lastUpdate > most_recent_update:
+            most_recent_update = item.lastUpdate
     missing_enumcron_penalty = 1 if False in enumcrons and len(enumcrons) > 1 else 0
-    return float(f"{len(group)}.{most_recent_update(group)}") - missing_enumcron_penalty
-
-
-def most_recent_update(items: Iterable[Item]) -> int:
-    return max(int(item.lastUpdate) for item in items)
+    return (len(group) - missing_enumcron_penalty, most_recent_update)
 
 
 def group_items_by_origin(items: Iterable[Item]) -> dict[tuple[str, str], list[Item]]:
-    groups = collections.defaultdict(list)
-    for item in items:
-        groups[(item.orig, item.fromRecord)].append(item)
-    return {origin: dedupe_enumcron(group) for origin, group in groups.items()}
-
-
-def dedupe_enumcron(items: Iterable[Item]) -> list[Item]:
-    volumes = dict()
+    # Dedupe enumcrons while grouping, keeping the most recently updated item
+    groups: dict[tuple[str, str], dict[Union[str, bool], Item]] = dict()
     for item in items:
+        volumes = groups.setdefault((item.orig, item.fromRecord), dict())
         normalcron = normalize_enumcron(item.enumcron)
-        if normalcron in volumes:
-            if int(item.lastUpdate) < int(volumes[normalcron].lastUpdate):
-                continue
-        volumes[normalcron] = item
-    return list(volumes.values())
+        current = volumes.get(normalcron)
+        if current is None or item.lastUpdate >= current.lastUpdate:
+            volumes[normalcron] = item
+    return {origin: list(volumes.values()) for origin, volumes in groups.items()}
 
 
 def normalize_enumcron(enumcron: Union[str, bool]) -> Union[str, bool]:
@@ -526,8 +642,13 @@ def normalize_enumcron(enumcron: Union[str, bool]) -> Union[str, bool]:
     return zap_copy_number(enumcron)
 
 
+@functools.lru_cache(maxsize=8192)
 def zap_copy_number(enumcron: str) -> Union[str, bool]:
-    zapped = re.sub(r"(^|\W)c(opy)?[\. ]?\d+", "", enumcron).strip()
+    # Copy numbers always start with a lowercase c
+    if "c" in enumcron:
+        zapped = COPY_NUMBER_PATTERN.sub("", enumcron).strip()
+    else:
+        zapped = enumcron.strip()
     return zapped if zapped.strip("[](){}<>, -") else False
 
 
@@ -563,21 +684,28 @@ def search_ht(
 
 
 def search_for_isn(value: str) -> tuple[str, str]:
-    if match := re.search(r"^[0-9]{4}-?[0-9]{3}[0-9xX]$", value):
+    # The shortest identifier is an 8 character ISSN without a hyphen
+    if len(value) < 8:
+        raise ValueError("no valid ISBN/ISSN found")
+    if match := ISSN_PATTERN.match(value):
         return match.group(), "issn"
-    if match := re.search(r"[0-9]{12}[0-9xX]", value):
+    if match := ISBN13_PATTERN.search(value):
         return match.group(), "isbn"
-    if match := re.search(r"[0-9]{9}[0-9xX]", value):
+    if match := ISBN10_PATTERN.search(value):
         return match.group(), "isbn"
     raise ValueError("no valid ISBN/ISSN found")
 
 
 def search_for_lccn(value: str) -> str:
-    if match := re.search(r"[0-9]{8}", value):
+    if match := LCCN_PATTERN.search(value):
         return match.group()
     raise ValueError("no valid LCCN found")
 
 
+# Rows of an export often share identifiers, keep recent responses in memory so
+# repeats skip the HTTP request (and any requests_cache lookup) entirely. The
+# returned dicts are shared between callers and must not be mutated.
+@functools.lru_cache(maxsize=4096)
 def query_ht_bib_api(
     id_: str,
     id_type: Literal["oclc", "lccn", "issn", "isbn", "htid", "recordnumber"],
@@ -591,30 +719,61 @@ def query_ht_bib_api(
     return response.json()
 
 
+class ThrottledHTTPAdapter(requests.adapters.HTTPAdapter):
+    # Spaces out requests that reach the network across all worker threads,
+    # responses served from requests_cache never get here
+    def __init__(self, delay: float, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._next_request = 0.0
+
+    def send(
+        self, request: requests.PreparedRequest, **kwargs: Any
+    ) -> requests.Response:
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_request - now
+            self._next_request = max(now, self._next_request) + self.delay
+        if wait > 0:
+            time.sleep(wait)
+        return super().send(request, **kwargs)
+
+
 def read_sierra_export(
     fp: io.StringIO,
     field_delimiter: str = "\t",
     text_qualifier: str = '"',
     repeated_field_delimiter: str = ";",
+    split_columns: Optional[set[str]] = None,
 ) -> "SierraExportReader":
-    sierra_export_dialect_name = "sierra"
-    csv.register_dialect(
-        sierra_export_dialect_name, delimiter=field_delimiter, quoting=csv.QUOTE_NONE
-    )
-    reader = csv.DictReader(fp, dialect=sierra_export_dialect_name)
+    reader = csv.reader(fp, dialect=SIERRA_DIALECT, delimiter=field_delimiter)
     return SierraExportReader(
         reader,
         text_qualifier=text_qualifier,
         repeated_field_delimter=repeated_field_delimiter,
+        split_columns=split_columns,
     )
 
 
 def _split_repeated_values(
     values: str, text_qualifier: str, repeated_field_delimiter: str
 ) -> list[str]:
-    values_list = values.split(
-        text_qualifier + repeated_field_delimiter + text_qualifier
+    return _split_on_separator(
+        values,
+        text_qualifier=text_qualifier,
+        separator=text_qualifier + repeated_field_delimiter + text_qualifier,
     )
+
+
+def _split_on_separator(values: str, text_qualifier: str, separator: str) -> list[str]:
+    if not values:
+        return []
+    # Most cells hold a single value
+    if separator not in values:
+        value = values.strip(text_qualifier)
+        return [value] if value else []
+    values_list = values.split(separator)
     values_list[0] = values_list[0].lstrip(text_qualifier)
     values_list[-1] = values_list[-1].rstrip(text_qualifier)
     return values_list if values_list[0] else []
@@ -622,29 +781,54 @@ def _split_repeated_values(
 
 class SierraExportReader(collections.abc.Iterable):
     fieldnames: list[str]
-    _dict_reader: csv.DictReader
+    column_indexes: dict[str, int]
+    _reader: Iterator[list[str]]
 
     def __init__(
         self,
-        dict_reader: csv.DictReader,
+        reader: Iterator[list[str]],
         text_qualifier: str,
         repeated_field_delimter: str,
+        split_columns: Optional[set[str]] = None,
     ) -> None:
-        self._dict_reader = dict_reader
+        self._reader = reader
         self.text_qualifier = text_qualifier
         self.repeated_field_delimiter = repeated_field_delimter
-        self.fieldnames = dict_reader.fieldnames
-
-    def __iter__(self) -> Iterator:
-        for row in self._dict_reader:
-            yield {
-                key: _split_repeated_values(
-                    values,
-                    text_qualifier=self.text_qualifier,
-                    repeated_field_delimiter=self.repeated_field_delimiter,
+        self.fieldnames = next(reader, [])
+        self.column_indexes = {key: index for index, key in enumerate(self.fieldnames)}
+        self.split_columns = split_columns
+        self._separator = text_qualifier + repeated_field_delimter + text_qualifier
+
+    def __iter__(self) -> Iterator[list[Union[list[str], str]]]:
+        text_qualifier = self.text_qualifier
+        separator = self._separator
+        width = len(self.fieldnames)
+        split_indexes = [
+            index
+            for key, index in self.column_indexes.items()
+            if self.split_columns is None or key in self.split_columns
+        ]
+        for row in self._reader:
+            # Skip blank lines and pad short rows like csv.DictReader. Extra
+            # fields would push the HT columns out from under their headers.
+            if not row:
+                continue
+            if len(row) < width:
+                row.extend([""] * (width - len(row)))
+            elif len(row) > width:
+                raise ValueError(
+                    f"row has {len(row)} fields but the header has {width}: {row}"
                 )
-                for key, values in row.items()
-            }
+            for index in split_indexes:
+                row[index] = _split_on_separator(row[index], text_qualifier, separator)
+            yield row
+
+    def join_repeated_values(self, values: str, joiner: str) -> str:
+        if self._separator not in values:
+            return values.lstrip(self.text_qualifier).rstrip(self.text_qualifier)
+        return joiner.join(
+            _split_on_separator(values, self.text_qualifier, self._separator)
+        )
 
 
 if __name__ == "__main__":
@@ -1,6 +1,10 @@
 import pytest
+import requests
 
-import datetime
+import argparse
+import concurrent.futures
+import contextlib
+import io
 import collections
 
 from ht_fetch_ids import ht_fetch_ids as hfi
@@ -119,7 +123,7 @@ def test_guess_mutual_spans(holdings, hts, n, result):
         (hfi.Enumcron(volumespan=(1, 1)), ["volumespan", "partspan"], {(1, None)},),
         (
             hfi.Enumcron(
-                datespan=(datetime.date(2000, 1, 1), datetime.date(2001, 12, 31)),
+                datespan=(2000, 2001),
             ),
             ["datespan"],
             {(2000,), (2001,)},
@@ -156,27 +160,52 @@ def test_filled_span_counts(enumcrons, count):
         ("pt. 1", hfi.Enumcron(partspan=(1, 1))),
         (
             "1900",
+            hfi.Enumcron(datespan=(1900, 1900)),
+        ),
+        (
+            "1926-27",
+            hfi.Enumcron(datespan=(1926, 1927)),
+        ),
+        (
+            "2002-2003",
+            hfi.Enumcron(datespan=(2002, 2003)),
+        ),
+        (
+            "v.1, 1900",
             hfi.Enumcron(
-                datespan=(datetime.date(1900, 1, 1), datetime.date(1900, 12, 31))
+                volumespan=(1, 1),
+                datespan=(1900, 1900),
             ),
         ),
+        ("v.2 cp.1", hfi.Enumcron(volumespan=(2, 2))),
         (
-            "1926-27",
+            "1931no.4",
             hfi.Enumcron(
-                datespan=(datetime.date(1926, 1, 1), datetime.date(1927, 12, 31))
+                numberspan=(4, 4),
+                datespan=(1931, 1931),
             ),
         ),
         (
-            "2002-2003",
+            "v.1-40 1990-99999",
             hfi.Enumcron(
-                datespan=(datetime.date(2002, 1, 1), datetime.date(2003, 12, 31))
+                volumespan=(1, 40),
+                datespan=(1990, 1990),
             ),
         ),
+        ("1999-05", hfi.Enumcron(datespan=(1999, 1999))),
+        ("c1985", hfi.Enumcron(datespan=(1985, 1985))),
         (
-            "v.1, 1900",
+            "v.1 c1985",
             hfi.Enumcron(
                 volumespan=(1, 1),
-                datespan=(datetime.date(1900, 1, 1), datetime.date(1900, 12, 31)),
+                datespan=(1985, 1985),
+            ),
+        ),
+        (
+            "Index c1975-1980",
+            hfi.Enumcron(
+                datespan=(1975, 1980),
+                is_index=True,
             ),
         ),
     ],
@@ -199,6 +228,42 @@ def test_zap_copy_number(raw, zapped):
     assert hfi.zap_copy_number(raw) == zapped
 
 
+def test_group_items_by_origin():
+    def item(orig, enumcron, lastUpdate):
+        return hfi.Item(
+            orig, "001", orig + enumcron, "", "pd", lastUpdate, enumcron, ""
+        )
+
+    items = [
+        item("a", "v.1", 20200101),
+        item("a", "v.1 c.2", 20210101),
+        item("a", "v.2", 20200101),
+        item("a", "v.2 c.2", 20190101),
+        item("b", "v.1", 20200101),
+    ]
+    groups = hfi.group_items_by_origin(items)
+    assert groups == {
+        ("a", "001"): [items[1], items[2]],
+        ("b", "001"): [items[4]],
+    }
+
+
+@pytest.mark.parametrize(
+    "enumcrons,lastUpdates,score",
+    [
+        (["v.1", "v.2"], [20200101, 20210101], (2, 20210101)),
+        (["v.1", False], [20200101, 20190101], (1, 20200101)),
+        ([False], [20200101], (1, 20200101)),
+    ],
+)
+def test_score_group(enumcrons, lastUpdates, score):
+    group = [
+        hfi.Item("a", "001", str(i), "", "pd", lastUpdate, enumcron, "")
+        for i, (enumcron, lastUpdate) in enumerate(zip(enumcrons, lastUpdates))
+    ]
+    assert hfi.score_group(group) == score
+
+
 @pytest.mark.parametrize(
     "raw,extracted",
     [
@@ -206,12 +271,20 @@ def test_zap_copy_number(raw, zapped):
         ("123456789x", ("123456789x", "isbn")),
         ("1234567890 extra", ("1234567890", "isbn")),
         ("before 123456789012x", ("123456789012x", "isbn")),
+        ("12345678901", ("1234567890", "isbn")),
+        ("0123456789 9780123456789", ("9780123456789", "isbn")),
     ],
 )
 def test_search_for_isn(raw, extracted):
     assert hfi.search_for_isn(raw) == extracted
 
 
+@pytest.mark.parametrize("raw", ["", "1234-56", "1234567", "no isbn here"])
+def test_search_for_isn_invalid(raw):
+    with pytest.raises(ValueError):
+        hfi.search_for_isn(raw)
+
+
 @pytest.mark.parametrize(
     "values,results",
     [
@@ -228,3 +301,114 @@ def test__split_repeated_values(values, results):
         )
         == results
     )
+
+
+def test_read_sierra_export_split_columns():
+    fp = io.StringIO('RECORD #\tVOLUME\n"b1"\t"v.1";"v.2"\n\n"b2";"b3"\n')
+    reader = hfi.read_sierra_export(fp, split_columns={"VOLUME", "MISSING"})
+    assert reader.fieldnames == ["RECORD #", "VOLUME"]
+    assert reader.column_indexes == {"RECORD #": 0, "VOLUME": 1}
+    rows = list(reader)
+    assert rows == [['"b1"', ["v.1", "v.2"]], ['"b2";"b3"', []]]
+    assert [reader.join_repeated_values(row[0], "; ") for row in rows] == [
+        "b1",
+        "b2; b3",
+    ]
+
+
+def test_read_sierra_export_extra_fields():
+    fp = io.StringIO('RECORD #\tOCLC #\n"b1"\t"123"\t"extra"\n')
+    reader = hfi.read_sierra_export(fp)
+    with pytest.raises(ValueError):
+        list(reader)
+
+
+@pytest.mark.parametrize("value", ["0", "-1"])
+def test_positive_int_invalid(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        hfi.positive_int(value)
+
+
+def test_bounded_map():
+    submitted = []
+
+    def values():
+        for value in range(10):
+            submitted.append(value)
+            yield value
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        results = hfi.bounded_map(executor, lambda x: x * 2, values(), limit=3)
+        assert next(results) == 0
+        assert len(submitted) == 4
+        assert list(results) == [2 * value for value in range(1, 10)]
+
+
+@pytest.mark.parametrize("delay", [0, 2])
+def test_throttled_http_adapter(monkeypatch, delay):
+    sent = []
+    sleeps = []
+    # Freeze the clock so each send's time is the shared start plus its sleep
+    monkeypatch.setattr(hfi.time, "monotonic", lambda: 100.0)
+    monkeypatch.setattr(hfi.time, "sleep", sleeps.append)
+    monkeypatch.setattr(
+        requests.adapters.HTTPAdapter,
+        "send",
+        lambda self, request, **kwargs: sent.append(request),
+    )
+
+    adapter = hfi.ThrottledHTTPAdapter(delay=delay)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(adapter.send, range(8)))
+
+    assert sorted(sent) == list(range(8))
+    if not delay:
+        assert sleeps == []
+    send_times = sorted(
+        [100.0] * (len(sent) - len(sleeps)) + [100.0 + s for s in sleeps]
+    )
+    assert all(
+        later - earlier >= delay for earlier, later in zip(send_times, send_times[1:])
+    )
+
+
+def test_main_redirected_stdout(monkeypatch, tmp_path):
+    export_path = tmp_path / "export.txt"
+    export_path.write_text('RECORD #\tOCLC #\n"b1"\t"123"\n"b2"\t""\n')
+    result = {
+        "records": {
+            "001": {
+                "recordURL": "https://catalog.hathitrust.org/Record/001",
+                "titles": [],
+                "isbns": [],
+                "issns": [],
+                "oclcs": ["123"],
+                "lccns": [],
+                "publishDates": [],
+            }
+        },
+        "items": [
+            {
+                "orig": "a",
+                "fromRecord": "001",
+                "htid": "a.1",
+                "itemURL": "",
+                "rightsCode": "pd",
+                "lastUpdate": "20200101",
+                "enumcron": False,
+                "usRightsString": "",
+            }
+        ],
+    }
+    monkeypatch.setattr(hfi, "query_ht_bib_api", lambda **kwargs: result)
+    monkeypatch.setattr("sys.argv", ["ht-fetch-ids", str(export_path)])
+
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        assert hfi.main() == 0
+    rows = output.getvalue().splitlines()
+    assert rows == [
+        "RECORD #\tOCLC #\tht-recordURLs\tenumcrons\tgroup-counts\thtids",
+        "b1\t123\thttps://catalog.hathitrust.org/Record/001\t\t1\ta.1",
+        "b2\t\t\t\t\t",
+    ]